@@ -6,6 +6,7 @@ Converts prices from Indian Rupees (INR) to US Dollars (USD)
 import pandas as pd
 import requests
 from datetime import datetime
+import json
 import logging
 import os
 
@@ -16,6 +17,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Columns added by the transform stage
+DERIVED_COLUMNS = ['price_inr', 'price_usd', 'currency', 'exchange_rate_used', 'conversion_date']
+
 
 def load_data_from_kaggle():
     """
@@ -41,11 +45,251 @@ def load_data_from_kaggle():
         return None
 
 
+class SnapshotCompactor:
+    """Delta-compacted store for repeated flight data snapshots"""
+
+    KEY_COLUMNS = ['airline', 'flight', 'source_city', 'destination_city', 'class', 'days_left']
+    # Row-number columns written by pandas/Kaggle exports, regenerated on rebuild
+    ROW_ID_COLUMNS = ['index', 'Unnamed: 0']
+    DELTA_META_COLUMNS = ['snapshot_id', 'key_hash', 'value_hash', 'removed']
+    # Written for missing values so that empty strings and 'NA' survive the round trip
+    NA_MARKER = '\\N'
+
+    def __init__(self, store_dir='snapshots', key_columns=None):
+        """
+        Initialize snapshot store
+
+        The store keeps three CSV files: a manifest with one row per snapshot,
+        a catalog with the key columns of every distinct key, and a delta log
+        with the full non-key values of a key whenever any of them (price,
+        stops, duration, ...) changes. A key that disappears from a snapshot
+        gets a delta with removed=True.
+
+        Args:
+            store_dir (str): Directory holding the manifest, catalog and delta log
+            key_columns (list): Columns identifying a row across snapshots
+        """
+        self.store_dir = store_dir
+        self.key_columns = key_columns or list(self.KEY_COLUMNS)
+        self.manifest_file = os.path.join(store_dir, 'manifest.csv')
+        self.catalog_file = os.path.join(store_dir, 'catalog.csv')
+        self.delta_file = os.path.join(store_dir, 'deltas.csv')
+
+    @staticmethod
+    def _canonical(df):
+        """
+        Cast columns to a dtype-independent form before hashing, so that
+        e.g. 5953 and 5953.0 hash the same when a NaN turns a column to float
+        """
+        return df.apply(
+            lambda col: col.astype('float64') if pd.api.types.is_numeric_dtype(col) else col.astype(object)
+        )
+
+    def hash_keys(self, df):
+        """
+        Hash the key columns of every row into a single uint64 (vectorized)
+
+        Rows sharing a key are told apart by their occurrence number within
+        the key, counted after sorting them by all columns so it does not
+        depend on input order.
+        """
+        canonical = self._canonical(df.reset_index(drop=True))
+        ordered = canonical
+        if canonical.duplicated(self.key_columns).any():
+            ordered = canonical.sort_values(list(canonical.columns), kind='stable')
+        keys = canonical[self.key_columns].assign(
+            _occurrence=ordered.groupby(self.key_columns, dropna=False, sort=False).cumcount()
+        )
+        return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_file):
+            return pd.DataFrame(columns=['snapshot_id', 'created_at', 'records', 'dtypes'])
+        return pd.read_csv(self.manifest_file)
+
+    @staticmethod
+    def _string_columns(manifest):
+        """Columns stored as strings in any recorded snapshot"""
+        columns = set()
+        for dtypes in manifest['dtypes']:
+            columns.update(
+                col for col, dtype in json.loads(dtypes).items()
+                if not pd.api.types.is_numeric_dtype(pd.api.types.pandas_dtype(dtype))
+            )
+        return columns
+
+    def _read_store_file(self, path, manifest):
+        """Read a catalog or delta file without losing string values"""
+        if not os.path.exists(path):
+            return None
+        header = pd.read_csv(path, nrows=0).columns
+        dtype = {'key_hash': 'uint64', 'value_hash': 'uint64', 'removed': 'bool'}
+        dtype.update({col: str for col in self._string_columns(manifest)})
+        return pd.read_csv(path, dtype={c: t for c, t in dtype.items() if c in header},
+                           keep_default_na=False, na_values=[self.NA_MARKER])
+
+    def _read_catalog(self, manifest):
+        return self._read_store_file(self.catalog_file, manifest)
+
+    def _read_deltas(self, manifest):
+        """Delta log, without rows of snapshots missing from the manifest"""
+        deltas = self._read_store_file(self.delta_file, manifest)
+        if deltas is None:
+            return None, 0
+        last_id = int(deltas['snapshot_id'].max()) if len(deltas) else 0
+        return deltas[deltas['snapshot_id'].isin(manifest['snapshot_id'])], last_id
+
+    @staticmethod
+    def _latest(deltas, snapshot_id=None):
+        """Latest delta per key, optionally as of a given snapshot"""
+        if snapshot_id is not None:
+            deltas = deltas[deltas['snapshot_id'] <= snapshot_id]
+        deltas = deltas.sort_values('snapshot_id', kind='stable')
+        return deltas.drop_duplicates('key_hash', keep='last')
+
+    def snapshot_ids(self):
+        """
+        List the ids of all snapshots recorded in the store
+        """
+        return self._read_manifest()['snapshot_id'].astype(int).tolist()
+
+    def compact(self, df):
+        """
+        Add a snapshot to the store, writing only new keys and changed rows
+
+        Args:
+            df (DataFrame): Full snapshot including the key columns
+
+        Returns:
+            int: Id assigned to the snapshot
+
+        Raises:
+            ValueError: If key columns are missing or the non-key columns
+                differ from the ones already in the store
+        """
+        missing = [c for c in self.key_columns if c not in df.columns]
+        if missing:
+            raise ValueError(f"Snapshot is missing key columns: {missing}")
+
+        snapshot = df.drop(columns=[c for c in self.ROW_ID_COLUMNS if c in df.columns])
+        value_columns = [c for c in snapshot.columns if c not in self.key_columns]
+
+        # Exact duplicates differ at most in their row number, drop them
+        snapshot = snapshot.drop_duplicates().reset_index(drop=True)
+        logger.info(f"Dropped {len(df) - len(snapshot)} duplicate records")
+        conflicts = snapshot.duplicated(self.key_columns).sum()
+        if conflicts:
+            logger.warning(f"Found {conflicts} records sharing a key with different values, keeping all")
+
+        manifest = self._read_manifest()
+        deltas, last_delta_id = self._read_deltas(manifest)
+        if deltas is not None:
+            stored_columns = [c for c in deltas.columns if c not in self.DELTA_META_COLUMNS]
+            if set(stored_columns) != set(value_columns):
+                raise ValueError(
+                    f"Snapshot columns {sorted(value_columns)} do not match "
+                    f"stored columns {sorted(stored_columns)}"
+                )
+            value_columns = stored_columns
+
+        current = pd.DataFrame({
+            'key_hash': self.hash_keys(snapshot),
+            'value_hash': pd.util.hash_pandas_object(
+                self._canonical(snapshot[value_columns]), index=False
+            ).to_numpy(),
+        })
+
+        # Ids left in the delta log by an interrupted run are never reused
+        last_id = int(manifest['snapshot_id'].max()) if len(manifest) else 0
+        snapshot_id = max(last_id, last_delta_id) + 1
+
+        if deltas is not None:
+            latest = self._latest(deltas)
+            latest = latest.loc[~latest['removed'], ['key_hash', 'value_hash']]
+        else:
+            latest = pd.DataFrame({'key_hash': pd.Series(dtype='uint64'),
+                                   'value_hash': pd.Series(dtype='uint64')})
+
+        # A row changed unless the same (key, values) pair is the latest one stored
+        merged = current.merge(latest, on=['key_hash', 'value_hash'], how='left', indicator=True)
+        changed = (merged['_merge'] == 'left_only').to_numpy()
+
+        changed_rows = pd.concat([current[changed], snapshot.loc[changed, value_columns]], axis=1)
+        changed_rows.insert(0, 'snapshot_id', snapshot_id)
+        changed_rows['removed'] = False
+
+        removed_rows = latest[~latest['key_hash'].isin(current['key_hash'])].assign(
+            snapshot_id=snapshot_id, removed=True
+        )
+        new_deltas = pd.concat([changed_rows, removed_rows], ignore_index=True)
+        new_deltas = new_deltas.reindex(columns=['snapshot_id', 'key_hash', 'value_hash'] + value_columns + ['removed'])
+
+        # Catalog stores each key's columns once, on first sighting
+        catalog = self._read_catalog(manifest)
+        known = catalog['key_hash'] if catalog is not None else pd.Series(dtype='uint64')
+        is_new = ~current['key_hash'].isin(known)
+        new_keys = pd.concat([current.loc[is_new, ['key_hash']], snapshot.loc[is_new, self.key_columns]], axis=1)
+        if catalog is not None:
+            new_keys = new_keys[list(catalog.columns)]
+
+        entry = pd.DataFrame([{
+            'snapshot_id': snapshot_id,
+            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'records': len(snapshot),
+            'dtypes': json.dumps({c: str(t) for c, t in df.dtypes.items()}),
+        }])
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        new_keys.to_csv(self.catalog_file, mode='a', index=False, header=catalog is None,
+                        na_rep=self.NA_MARKER)
+        new_deltas.to_csv(self.delta_file, mode='a', index=False, header=deltas is None,
+                          na_rep=self.NA_MARKER)
+        entry.to_csv(self.manifest_file, mode='a', index=False, header=not len(manifest))
+
+        logger.info(f"Snapshot {snapshot_id}: {len(snapshot)} records, "
+                    f"{len(new_keys)} new keys, {len(new_deltas)} deltas written")
+        return snapshot_id
+
+    def rebuild(self, snapshot_id=None):
+        """
+        Rebuild a full snapshot from the catalog and delta log
+
+        Columns and dtypes are restored as they were passed to compact().
+        Rows come back in order of first sighting, and row-number columns
+        such as 'index' are renumbered from 0.
+
+        Args:
+            snapshot_id (int): Snapshot to rebuild (defaults to the latest)
+
+        Returns:
+            DataFrame: Snapshot rows, or None if the snapshot does not exist
+        """
+        manifest = self._read_manifest()
+        if snapshot_id is None and len(manifest):
+            snapshot_id = int(manifest['snapshot_id'].max())
+        entry = manifest[manifest['snapshot_id'] == snapshot_id]
+        if entry.empty:
+            logger.error(f"Snapshot {snapshot_id} not found in {self.store_dir}")
+            return None
+        dtypes = json.loads(entry['dtypes'].iloc[0])
+
+        catalog = self._read_catalog(manifest)
+        deltas, _ = self._read_deltas(manifest)
+        latest = self._latest(deltas, snapshot_id)
+        latest = latest[~latest['removed']].drop(columns=['snapshot_id', 'value_hash', 'removed'])
+        snapshot = catalog.merge(latest, on='key_hash', how='inner').drop(columns=['key_hash'])
+
+        for col in self.ROW_ID_COLUMNS:
+            if col in dtypes:
+                snapshot[col] = range(len(snapshot))
+        return snapshot[list(dtypes)].astype(dtypes).reset_index(drop=True)
+
+
 class FlightDataETL:
     """ETL Pipeline for flight data with currency conversion"""
     
     def __init__(self, input_file=None, output_file='airlines_flights_data_usd.csv', 
-                 exchange_rate=None, use_kaggle=False):
+                 exchange_rate=None, use_kaggle=False, compact_dir=None):
         """
         Initialize ETL pipeline
         
@@ -54,11 +298,13 @@ class FlightDataETL:
             output_file (str): Path to output CSV file
             exchange_rate (float): Optional fixed exchange rate (INR to USD)
             use_kaggle (bool): If True, load data from Kaggle API instead of local file
+            compact_dir (str): Optional directory for the delta-compacted snapshot store
         """
         self.input_file = input_file
         self.output_file = output_file
         self.exchange_rate = exchange_rate
         self.use_kaggle = use_kaggle
+        self.compact_dir = compact_dir
         self.data = None
         
     def get_exchange_rate(self):
@@ -172,14 +418,14 @@ class FlightDataETL:
             # Reorder columns to put USD price prominently
             cols = list(self.data.columns)
             # Remove the new columns from their current position
-            for col in ['price_inr', 'price_usd', 'currency', 'exchange_rate_used', 'conversion_date']:
+            for col in DERIVED_COLUMNS:
                 if col in cols:
                     cols.remove(col)
             
             # Insert them after 'price' column
             price_idx = cols.index('price')
             new_cols = (cols[:price_idx+1] + 
-                       ['price_inr', 'price_usd', 'currency', 'exchange_rate_used', 'conversion_date'] + 
+                       DERIVED_COLUMNS + 
                        cols[price_idx+1:])
             
             self.data = self.data[new_cols]
@@ -197,6 +443,19 @@ class FlightDataETL:
             logger.error(f"Failed to load data: {e}")
             return False
     
+    def compact(self):
+        """
+        Compact: Add the raw snapshot to the delta-compacted store
+        """
+        logger.info(f"Compacting snapshot into {self.compact_dir}...")
+        try:
+            compactor = SnapshotCompactor(self.compact_dir)
+            compactor.compact(self.data.drop(columns=DERIVED_COLUMNS))
+            return True
+        except Exception as e:
+            logger.error(f"Failed to compact snapshot: {e}")
+            return False
+    
     def create_summary_report(self):
         """
         Create a summary report of the ETL process
@@ -270,6 +529,11 @@ class FlightDataETL:
             logger.error("ETL pipeline failed at loading stage")
             return False
         
+        # Compact (optional); output files are already written, so a store
+        # problem does not fail the run
+        if self.compact_dir and not self.compact():
+            logger.warning("Snapshot was not added to the compacted store, output files are unaffected")
+        
         logger.info("="*60)
         logger.info("ETL pipeline completed successfully!")
         return True
@@ -282,6 +546,9 @@ def main():
     # Check if user wants to use Kaggle API
     use_kaggle = '--kaggle' in sys.argv or '-k' in sys.argv
     
+    # Check if user wants to add the snapshot to the compacted store
+    compact_dir = 'snapshots' if '--compact' in sys.argv or '-c' in sys.argv else None
+    
     if use_kaggle:
         print("Using Kaggle API to fetch data...")
         print("Note: Make sure you have kagglehub installed: pip install kagglehub")
@@ -289,13 +556,14 @@ def main():
         # Initialize and run ETL pipeline with Kaggle
         etl = FlightDataETL(
             output_file='airlines_flights_data_usd.csv',
-            use_kaggle=True
+            use_kaggle=True,
+            compact_dir=compact_dir
         )
     else:
         # Use local file
         input_file = 'airlines_flights_data.csv'
         output_file = 'airlines_flights_data_usd.csv'
-        etl = FlightDataETL(input_file, output_file)
+        etl = FlightDataETL(input_file, output_file, compact_dir=compact_dir)
     
     success = etl.run()
     
@@ -309,9 +577,12 @@ def main():
             print(f"✓ Input file:  {etl.input_file}")
         print(f"✓ Output file: {etl.output_file}")
         print(f"✓ Summary:     {etl.output_file.replace('.csv', '_summary.txt')}")
+        if compact_dir:
+            print(f"✓ Snapshots:   {compact_dir}/")
         print("="*60)
         print("\nTip: Use --kaggle or -k flag to load data from Kaggle API")
         print("     python etl_pipeline.py --kaggle")
+        print("     Use --compact or -c to add the snapshot to the delta store in snapshots/")
     else:
         print("\nETL process failed. Check logs for details.")
 
@@ -4,8 +4,9 @@ Runs a quick test on a sample of the data to verify everything works
 """
 
 import pandas as pd
-from etl_pipeline import FlightDataETL
+from etl_pipeline import FlightDataETL, SnapshotCompactor
 import os
+import shutil
 
 
 def test_etl_pipeline():
@@ -110,6 +111,164 @@ def test_etl_pipeline():
     return True
 
 
+def test_snapshot_compaction():
+    """Test that compacted snapshots rebuild exactly"""
+    
+    print("="*60)
+    print("SNAPSHOT COMPACTION TEST")
+    print("="*60)
+    
+    store_dir = 'test_snapshots'
+    if os.path.exists(store_dir):
+        shutil.rmtree(store_dir)
+    
+    def scrape(rows):
+        columns = ['airline', 'flight', 'source_city', 'departure_time', 'stops',
+                   'destination_city', 'class', 'days_left', 'price']
+        df = pd.DataFrame(rows, columns=columns)
+        df.insert(0, 'index', range(len(df)))
+        return df
+    
+    # Day 1 repeats a row under a different row number
+    day1 = scrape([
+        ['SpiceJet', 'SG-8709', 'Delhi', 'Evening', 'zero', 'Mumbai', 'Economy', 1, 5953],
+        ['SpiceJet', 'SG-8709', 'Delhi', 'Evening', 'zero', 'Mumbai', 'Economy', 1, 5953],
+        ['Vistara', 'UK-706', 'Delhi', 'Morning', 'one', 'Mumbai', 'Economy', 1, 5955],
+        ['Vistara', 'UK-706', 'Delhi', 'Morning', 'one', 'Mumbai', 'Business', 1, 42000],
+    ])
+    # Day 2 is an unchanged re-scrape
+    day2 = day1.copy()
+    # Day 3 changes a price, changes stops at the same price, and reorders columns
+    day3 = day1.drop(index=1).reset_index(drop=True)
+    day3['index'] = range(len(day3))
+    day3.loc[day3['class'] == 'Business', 'price'] = 43500
+    day3.loc[day3['flight'] == 'SG-8709', 'stops'] = 'two'
+    day3 = day3[list(reversed(day3.columns))]
+    # Day 4 drops Vistara, adds a flight without a price and two rows sharing a key
+    day4 = scrape([
+        ['SpiceJet', 'SG-8709', 'Delhi', 'Evening', 'two', 'Mumbai', 'Economy', 1, 5953],
+        ['Air_India', 'AI-868', 'Delhi', 'Evening', 'zero', 'Mumbai', 'Economy', 1, None],
+        ['GO_FIRST', 'G8-334', 'Delhi', 'Morning', 'zero', 'Mumbai', 'Economy', 1, 5954],
+        ['GO_FIRST', 'G8-334', 'Delhi', 'Night', 'zero', 'Mumbai', 'Economy', 1, 5954],
+    ])
+    days = [day1, day2, day3, day4]
+    # Expected delta rows per snapshot: 3 new keys; none; 2 changes; 2 removals, 3 new keys.
+    # The None in day 4 turns price into float, which must not re-store SpiceJet.
+    expected_deltas = {1: 3, 3: 2, 4: 5}
+    
+    def normalized(df):
+        df = df.drop(columns=['index']).drop_duplicates()
+        return df.sort_values(list(df.columns)).reset_index(drop=True)
+    
+    print("\n1. Compacting snapshots...")
+    try:
+        compactor = SnapshotCompactor(store_dir)
+        ids = [compactor.compact(day) for day in days]
+        if ids != [1, 2, 3, 4] or compactor.snapshot_ids() != ids:
+            print(f"   ✗ Unexpected snapshot ids: {ids}, {compactor.snapshot_ids()}")
+            return False
+        print(f"   ✓ Every snapshot recorded with a unique id")
+        
+        deltas = pd.read_csv(os.path.join(store_dir, 'deltas.csv'))
+        counts = deltas['snapshot_id'].value_counts().to_dict()
+        if counts != expected_deltas:
+            print(f"   ✗ Unexpected delta counts: {counts} != {expected_deltas}")
+            return False
+        print(f"   ✓ Stored {len(deltas)} deltas for {sum(len(d) for d in days)} records")
+    except Exception as e:
+        print(f"   ✗ Compaction error: {e}")
+        return False
+    
+    print("\n2. Rebuilding snapshots...")
+    try:
+        for snapshot_id, day in zip(ids, days):
+            rebuilt = compactor.rebuild(snapshot_id)
+            if list(rebuilt.columns) != list(day.columns):
+                print(f"   ✗ Snapshot {snapshot_id} column order not restored")
+                return False
+            if not normalized(rebuilt).equals(normalized(day)):
+                print(f"   ✗ Snapshot {snapshot_id} does not match original")
+                return False
+            if list(rebuilt['index']) != list(range(len(rebuilt))):
+                print(f"   ✗ Snapshot {snapshot_id} row numbers not regenerated")
+                return False
+        print(f"   ✓ All {len(ids)} snapshots rebuilt exactly, including dtypes")
+        
+        if compactor.rebuild(99) is not None:
+            print("   ✗ Unknown snapshot id did not return None")
+            return False
+        print("   ✓ Unknown snapshot id rejected")
+    except Exception as e:
+        print(f"   ✗ Rebuild error: {e}")
+        return False
+    
+    print("\n3. Rejecting mismatched columns...")
+    try:
+        compactor.compact(day1.drop(columns=['stops']))
+        print("   ✗ Snapshot with different columns was accepted")
+        return False
+    except ValueError:
+        print("   ✓ Snapshot with different columns rejected")
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+    
+    print("\n4. Handling dtype changes, reordering and interrupted runs...")
+    try:
+        compactor = SnapshotCompactor(store_dir)
+        base = pd.DataFrame({
+            'airline': ['Indigo'] * 4,
+            'flight': ['6E-2046', '6E-2046', '6E-5001', '6E-5002'],
+            'source_city': ['Delhi'] * 4,
+            'destination_city': ['Mumbai'] * 4,
+            'class': ['Economy'] * 4,
+            'days_left': [1, 1, 1, 1],
+            'stops': ['1', 'NA', '', '001'],
+            'price': [5953, 5954, 5955, 5956],
+        })
+        compactor.compact(base)
+        
+        # Same rows reversed, days_left as float and a missing price on one row
+        rescrape = base.iloc[::-1].astype({'days_left': float})
+        rescrape.loc[rescrape['flight'] == '6E-5002', 'price'] = None
+        compactor.compact(rescrape)
+        deltas = pd.read_csv(os.path.join(store_dir, 'deltas.csv'))
+        catalog = pd.read_csv(os.path.join(store_dir, 'catalog.csv'))
+        if (deltas['snapshot_id'] == 2).sum() != 1 or len(catalog) != 4:
+            print(f"   ✗ Dtype change or reordering re-stored rows: {(deltas['snapshot_id'] == 2).sum()} deltas, "
+                  f"{len(catalog)} keys")
+            return False
+        print("   ✓ Only the changed price stored after int→float and reordering")
+        
+        rebuilt = compactor.rebuild(1)
+        if not normalized(rebuilt.assign(index=0)).equals(normalized(base.assign(index=0))):
+            print(f"   ✗ String values not preserved: {list(rebuilt['stops'])}")
+            return False
+        print("   ✓ String values such as '1', 'NA', '' and '001' preserved")
+        
+        # Simulate a run that died after writing deltas but before the manifest
+        manifest_file = os.path.join(store_dir, 'manifest.csv')
+        with open(manifest_file) as f:
+            manifest = f.read()
+        compactor.compact(base.drop(index=0))
+        with open(manifest_file, 'w') as f:
+            f.write(manifest)
+        snapshot_id = compactor.compact(base)
+        if snapshot_id != 4 or compactor.snapshot_ids() != [1, 2, 4]:
+            print(f"   ✗ Orphaned snapshot id reused: {snapshot_id}")
+            return False
+        if not normalized(compactor.rebuild(4).assign(index=0)).equals(normalized(base.assign(index=0))):
+            print("   ✗ Snapshot after interrupted run does not match original")
+            return False
+        print("   ✓ Orphaned deltas of an interrupted run are skipped")
+    except Exception as e:
+        print(f"   ✗ Robustness error: {e}")
+        return False
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+    
+    return True
+
+
 def main():
     """Main test execution"""
     print("\n")
@@ -119,7 +278,9 @@ def main():
     print("\nThis will test the ETL pipeline with a small sample of data.")
     print("The full dataset will not be modified.\n")
     
-    success = test_etl_pipeline()
+    pipeline_ok = test_etl_pipeline()
+    compaction_ok = test_snapshot_compaction()
+    success = pipeline_ok and compaction_ok
     
     print("\n" + "="*60)
     if success: